@@ -102,65 +102,77 @@ def test_get_data_sample(num, k_size, v_size, batch_size, percent):
 
 
 def insert(db: ADB):
+    db_insert, value = db.insert, data_sample.value
     for key in data_sample.keys:
-        db.insert(key, data_sample.value)
+        db_insert(key, value)
 
 
 def insert_raw(db: ADB):
+    db_insert_raw, value = db.insert_raw, data_sample.bytes_value
     for key in data_sample.bytes_keys:
-        db.insert_raw(key, data_sample.bytes_value)
+        db_insert_raw(key, value)
 
 
 def get(db: ADB):
+    db_get, value = db.get, data_sample.value
     for key in data_sample.keys:
-        assert db.get(key) == data_sample.value
+        assert db_get(key) == value
 
 
 def get_raw(db: ADB):
+    db_get_raw, value = db.get_raw, data_sample.bytes_value
     for key in data_sample.bytes_keys:
-        assert db.get_raw(key) == data_sample.bytes_value
+        assert db_get_raw(key) == value
 
 
 def random_get(db: ADB):
+    db_get, value = db.get, data_sample.value
     for key in data_sample.random_selected_keys:
-        assert db.get(key) == data_sample.value
+        assert db_get(key) == value
 
 
 def random_get_raw(db: ADB):
+    db_get_raw, value = db.get_raw, data_sample.bytes_value
     for key in data_sample.random_selected_bytes_keys:
-        assert db.get_raw(key) == data_sample.bytes_value
+        assert db_get_raw(key) == value
 
 
 def batch_insert(db: ADB):
+    db_batch_insert = db.batch_insert
     for batch in data_sample.batched_kv:
-        db.batch_insert(batch)
+        db_batch_insert(batch)
 
 
 def batch_insert_raw(db: ADB):
+    db_batch_insert_raw = db.batch_insert_raw
     for batch in data_sample.bytes_batched_kv:
-        db.batch_insert_raw(batch)
+        db_batch_insert_raw(batch)
 
 
 def multi_get(db: ADB):
+    db_multi_get, value = db.multi_get, data_sample.value
     for batch in data_sample.batched_kv:
-        expected = [data_sample.value] * len(batch)
-        assert db.multi_get([k for k, _ in batch]) == expected
+        expected = [value] * len(batch)
+        assert db_multi_get([k for k, _ in batch]) == expected
 
 
 def multi_get_raw(db: ADB):
+    db_multi_get_raw, value = db.multi_get_raw, data_sample.bytes_value
     for batch in data_sample.bytes_batched_kv:
-        expected = [data_sample.bytes_value] * len(batch)
-        assert db.multi_get_raw([k for k, _ in batch]) == expected
+        expected = [value] * len(batch)
+        assert db_multi_get_raw([k for k, _ in batch]) == expected
 
 
 def delete(db: ADB):
+    db_delete = db.delete
     for key in data_sample.keys:
-        db.delete(key)
+        db_delete(key)
 
 
 def delete_raw(db: ADB):
+    db_delete_raw = db.delete_raw
     for key in data_sample.bytes_keys:
-        db.delete_raw(key)
+        db_delete_raw(key)
 
 
 @pytest.fixture()
@@ -1,3 +1,11 @@
+import os
+import warnings
+
+import pytest
+
+CPU_GOVERNOR = "/sys/devices/system/cpu/cpu{}/cpufreq/scaling_governor"
+
+
 def pytest_addoption(parser):
     parser.addoption("--dbname", action="store", default="rocks_db")
     parser.addoption("--num", action="store", default=1000)
@@ -5,3 +13,35 @@ def pytest_addoption(parser):
     parser.addoption("--v_size", action="store", default=100)
     parser.addoption("--batch_size", action="store", default=100)
     parser.addoption("--percent", action="store", default=0.01)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def pin_cpu():
+    """Pin the benchmark process to the core given by `BENCH_CPU`.
+
+    Pinning cuts the variance caused by core migration and frequency
+    scaling, so results are comparable from run to run. Only active on
+    Linux when `BENCH_CPU` is set, e.g.:
+
+        BENCH_CPU=2 chrt -f 50 pytest -s benchmark.py ...
+
+    where `chrt -f 50` optionally runs the process under a real-time
+    scheduling policy.
+    """
+    cpu = os.environ.get("BENCH_CPU")
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    cpu = int(cpu)
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, {cpu})
+    try:
+        with open(CPU_GOVERNOR.format(cpu)) as f:
+            governor = f.read().strip()
+        if governor != "performance":
+            warnings.warn(f"cpu{cpu} scaling governor is `{governor}`, "
+                          f"set it to `performance` for stable results")
+    except OSError:
+        pass
+    yield
+    os.sched_setaffinity(0, previous)
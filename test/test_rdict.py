@@ -1,171 +1,263 @@
 import unittest
 from sys import getrefcount
-from rocksdict import Rdict, Options, PlainTableFactoryOptions, SliceTransform, CuckooTableOptions
-from random import randint, random, getrandbits
+from rocksdict import (Rdict, Options, WriteBatch, WriteOptions, BlockBasedOptions, SstFileWriter,
+                       PlainTableFactoryOptions, SliceTransform, CuckooTableOptions)
+from random import randint, random, choices, sample
+from itertools import islice
+from bisect import bisect_left, bisect_right
 import os
 import sys
 
 
 TEST_INT_RANGE_UPPER = 999999
+TEST_INT_RANGE_MAX = TEST_INT_RANGE_UPPER - 1
+WRITE_BATCH_SIZE = 1000
 
 
 def randbytes(n):
     """Generate n random bytes."""
-    return getrandbits(n * 8).to_bytes(n, 'little')
+    return os.urandom(n)
+
+
+def random_ints(n):
+    """Generate n random integers in [0, TEST_INT_RANGE_UPPER)."""
+    return choices(range(TEST_INT_RANGE_UPPER), k=n)
+
+
+def bulk_randbytes(count, n):
+    """Generate `count` random byte strings of length n."""
+    buf = os.urandom(count * n)
+    return [buf[i * n:(i + 1) * n] for i in range(count)]
 
 
 def compare_dicts(test_case: unittest.TestCase,
                   ref_dict: dict,
                   test_dict: Rdict):
     # assert that the values are the same
-    test_case.assertEqual({k: v for k, v in test_dict.items()}, ref_dict)
+    test_case.assertEqual(dict(test_dict.items()), ref_dict)
+
+
+def bulk_put(test_dict: Rdict, keys: list, values: list, write_opt: WriteOptions):
+    """Write keys and values to test_dict in batches of WRITE_BATCH_SIZE."""
+    for i in range(0, len(keys), WRITE_BATCH_SIZE):
+        wb = WriteBatch()
+        for key, value in zip(keys[i:i + WRITE_BATCH_SIZE], values[i:i + WRITE_BATCH_SIZE]):
+            wb.put(key, value)
+        test_dict.write(wb, write_opt)
+
+
+def bulk_delete(test_dict: Rdict, keys: list, write_opt: WriteOptions):
+    """Delete keys from test_dict in batches of WRITE_BATCH_SIZE."""
+    for i in range(0, len(keys), WRITE_BATCH_SIZE):
+        wb = WriteBatch()
+        for key in keys[i:i + WRITE_BATCH_SIZE]:
+            wb.delete(key)
+        test_dict.write(wb, write_opt)
+
+
+def short_lived_db_options(mmap_writes: bool = True) -> Options:
+    """Options that keep the whole test workload in memtable, without compactions."""
+    opt = Options()
+    opt.create_if_missing(True)
+    # access table files through mmap, except on windows
+    if not sys.platform.startswith('win'):
+        opt.set_allow_mmap_reads(True)
+        opt.set_allow_mmap_writes(mmap_writes)
+    opt.set_write_buffer_size(128 * 1024 * 1024)
+    opt.set_max_write_buffer_number(2)
+    opt.set_disable_auto_compactions(True)
+    # do not load table properties when test_reopen opens the db again
+    opt.set_skip_stats_update_on_db_open(True)
+    return opt
+
+
+def short_lived_write_options() -> WriteOptions:
+    """Write options for test dbs that are destroyed after the tests: skip WAL."""
+    write_opt = WriteOptions()
+    write_opt.disable_wal(True)
+    return write_opt
 
 
 class TestIterBytes(unittest.TestCase):
     test_dict = None
+    path = None
     ref_dict = None
+    sorted_keys = None
     opt = None
+    write_opt = None
 
     @classmethod
     def setUpClass(cls) -> None:
-        cls.opt = Options()
+        cls.opt = short_lived_db_options(mmap_writes=False)
         cls.opt.increase_parallelism(os.cpu_count())
-        cls.test_dict = Rdict("./temp_iter_bytes", cls.opt)
-        cls.ref_dict = dict()
-        for i in range(100000):
-            key = randbytes(10)
-            value = randbytes(20)
-            cls.test_dict[key] = value
-            cls.ref_dict[key] = value
-        keys_to_remove = list(set(randint(0, len(cls.ref_dict) - 1) for _ in range(50000)))
-        keys = [k for k in cls.ref_dict.keys()]
-        keys_to_remove = [keys[i] for i in keys_to_remove]
+        # larger blocks, smaller index for the scan-heavy tests
+        table_opt = BlockBasedOptions()
+        table_opt.set_block_size(64 * 1024)
+        cls.opt.set_block_based_table_factory(table_opt)
+        cls.path = f"./temp_iter_bytes_{os.getpid()}"
+        cls.test_dict = Rdict(cls.path, cls.opt)
+        cls.write_opt = short_lived_write_options()
+        cls.ref_dict = dict(zip(bulk_randbytes(100000, 10), bulk_randbytes(100000, 20)))
+        # bulk load through an sst file, which needs strictly increasing keys
+        sst_path = f"{cls.path}.sst"
+        writer = SstFileWriter(cls.opt)
+        writer.open(sst_path)
+        sorted_keys = sorted(cls.ref_dict)
+        try:
+            for key in sorted_keys:
+                writer[key] = cls.ref_dict[key]
+            writer.finish()
+            cls.test_dict.ingest_external_file([sst_path])
+        finally:
+            os.remove(sst_path)
+        keys_to_remove = sample(list(cls.ref_dict), 50000)
+        wb = WriteBatch()
         for key in keys_to_remove:
-            del cls.test_dict[key]
+            wb.delete(key)
             del cls.ref_dict[key]
+        cls.test_dict.write(wb, cls.write_opt)
+        # the seek tests bisect this instead of filtering ref_dict
+        cls.sorted_keys = [k for k in sorted_keys if k in cls.ref_dict]
 
     def test_seek_forward_key(self):
         key = randbytes(10)
-        ref_list = [k for k in self.ref_dict.keys() if k >= key]
-        ref_list.sort()
-        self.assertEqual([k for k in self.test_dict.keys(from_key=key)], ref_list)
+        ref_list = self.sorted_keys[bisect_left(self.sorted_keys, key):]
+        self.assertEqual(list(self.test_dict.keys(from_key=key)), ref_list)
 
     def test_seek_backward_key(self):
         key = randbytes(20)
-        ref_list = [k for k in self.ref_dict.keys() if k <= key]
-        ref_list.sort(reverse=True)
-        self.assertEqual([k for k in self.test_dict.keys(from_key=key, backwards=True)], ref_list)
+        ref_list = self.sorted_keys[:bisect_right(self.sorted_keys, key)][::-1]
+        self.assertEqual(list(self.test_dict.keys(from_key=key, backwards=True)), ref_list)
 
     def test_seek_forward(self):
         key = randbytes(20)
-        self.assertEqual({k: v for k, v in self.test_dict.items(from_key=key)},
-                         {k: v for k, v in self.ref_dict.items() if k >= key})
+        self.assertEqual(dict(self.test_dict.items(from_key=key)),
+                         {k: self.ref_dict[k] for k in self.sorted_keys[bisect_left(self.sorted_keys, key):]})
 
     def test_seek_backward(self):
         key = randbytes(20)
-        self.assertEqual({k: v for k, v in self.test_dict.items(from_key=key, backwards=True)},
-                         {k: v for k, v in self.ref_dict.items() if k <= key})
+        self.assertEqual(dict(self.test_dict.items(from_key=key, backwards=True)),
+                         {k: self.ref_dict[k] for k in self.sorted_keys[:bisect_right(self.sorted_keys, key)]})
 
     @classmethod
     def tearDownClass(cls):
         cls.test_dict.close()
-        Rdict.destroy("./temp_iter_bytes", Options())
+        Rdict.destroy(cls.path, cls.opt)
 
 
 class TestIterInt(unittest.TestCase):
     test_dict = None
+    path = None
     ref_dict = None
     opt = None
 
     @classmethod
     def setUpClass(cls) -> None:
-        cls.test_dict = Rdict("./temp_iter_int")
+        cls.opt = Options()
+        cls.path = f"./temp_iter_int_{os.getpid()}"
+        cls.test_dict = Rdict(cls.path, cls.opt)
         cls.ref_dict = dict()
-        for i in range(10000):
-            key = randint(0, TEST_INT_RANGE_UPPER - 1)
-            value = randint(0, TEST_INT_RANGE_UPPER - 1)
+        for key, value in zip(random_ints(10000), random_ints(10000)):
             cls.ref_dict[key] = value
             cls.test_dict[key] = value
-        for i in range(5000):
-            key = randint(0, TEST_INT_RANGE_UPPER - 1)
+        for key in random_ints(5000):
             if key in cls.ref_dict:
                 del cls.ref_dict[key]
                 del cls.test_dict[key]
 
     def test_seek_forward(self):
-        self.assertEqual({k: v for k, v in self.test_dict.items()},
-                         {k: v for k, v in self.ref_dict.items()})
+        self.assertEqual(dict(self.test_dict.items()), self.ref_dict)
 
     def test_seek_backward(self):
-        self.assertEqual({k: v for k, v in self.test_dict.items(backwards=True)},
-                         {k: v for k, v in self.ref_dict.items()})
+        self.assertEqual(dict(self.test_dict.items(backwards=True)), self.ref_dict)
 
     def test_seek_forward_key(self):
-        key = randint(0, TEST_INT_RANGE_UPPER - 1)
+        key = randint(0, TEST_INT_RANGE_MAX)
         ref_list = [k for k in self.ref_dict.keys() if k >= key]
         ref_list.sort()
-        self.assertEqual([k for k in self.test_dict.keys(from_key=key)], ref_list)
+        self.assertEqual(list(self.test_dict.keys(from_key=key)), ref_list)
 
     def test_seek_backward_key(self):
-        key = randint(0, TEST_INT_RANGE_UPPER - 1)
+        key = randint(0, TEST_INT_RANGE_MAX)
         ref_list = [k for k in self.ref_dict.keys() if k <= key]
         ref_list.sort(reverse=True)
-        self.assertEqual([k for k in self.test_dict.keys(from_key=key, backwards=True)], ref_list)
+        self.assertEqual(list(self.test_dict.keys(from_key=key, backwards=True)), ref_list)
 
     @classmethod
     def tearDownClass(cls):
         cls.test_dict.close()
-        Rdict.destroy("./temp_iter_int", Options())
+        Rdict.destroy(cls.path, cls.opt)
 
 
 class TestInt(unittest.TestCase):
     test_dict = None
+    path = None
     ref_dict = None
     opt = None
+    write_opt = None
 
     @classmethod
     def setUpClass(cls) -> None:
-        cls.opt = Options()
-        cls.opt.create_if_missing(True)
+        cls.opt = short_lived_db_options()
         cls.opt.set_plain_table_factory(PlainTableFactoryOptions())
         cls.opt.set_prefix_extractor(SliceTransform.create_max_len_prefix(8))
-        cls.test_dict = Rdict("./temp_int", cls.opt)
+        cls.path = f"./temp_int_{os.getpid()}"
+        cls.test_dict = Rdict(cls.path, cls.opt)
+        cls.write_opt = short_lived_write_options()
+        cls.test_dict.set_write_options(cls.write_opt)
         cls.ref_dict = dict()
 
     def test_add_integer(self):
-        for i in range(10000):
-            key = randint(0, TEST_INT_RANGE_UPPER - 1)
-            value = randint(0, TEST_INT_RANGE_UPPER - 1)
+        # distinct keys: every put is a fresh insert, not an overwrite
+        keys = sample(range(TEST_INT_RANGE_UPPER), 10000)
+        values = random_ints(10000)
+        for key, value in zip(keys, values):
             self.ref_dict[key] = value
             self.test_dict[key] = value
 
         compare_dicts(self, self.ref_dict, self.test_dict)
 
+    def test_add_integer_batch(self):
+        keys = random_ints(10000)
+        values = random_ints(10000)
+        self.ref_dict.update(zip(keys, values))
+        bulk_put(self.test_dict, keys, values, self.write_opt)
+
+        compare_dicts(self, self.ref_dict, self.test_dict)
+
     def test_delete_integer(self):
-        for i in range(5000):
-            key = randint(0, TEST_INT_RANGE_UPPER - 1)
+        for key in random_ints(5000):
             if key in self.ref_dict:
                 del self.ref_dict[key]
                 del self.test_dict[key]
 
         compare_dicts(self, self.ref_dict, self.test_dict)
 
+    def test_delete_integer_batch(self):
+        keys = [key for key in set(random_ints(5000)) if key in self.ref_dict]
+        for key in keys:
+            del self.ref_dict[key]
+        bulk_delete(self.test_dict, keys, self.write_opt)
+
+        compare_dicts(self, self.ref_dict, self.test_dict)
+
     def test_reopen(self):
         self.test_dict.close()
-        test_dict = Rdict("./temp_int", self.opt)
+        test_dict = Rdict(self.path, self.opt)
         compare_dicts(self, self.ref_dict, test_dict)
 
     def test_get_batch(self):
-        keys = list(self.ref_dict.keys())[:100]
+        keys = list(islice(self.ref_dict, 100))
         self.assertEqual(self.test_dict[keys + ["no such key"] * 3], [self.ref_dict[k] for k in keys] + [None] * 3)
 
     @classmethod
     def tearDownClass(cls):
-        Rdict.destroy("./temp_int", cls.opt)
+        Rdict.destroy(cls.path, cls.opt)
 
 
 class TestBigInt(unittest.TestCase):
     test_dict = None
+    path = None
     opt = None
 
     @classmethod
@@ -174,7 +266,8 @@ class TestBigInt(unittest.TestCase):
         cls.opt.create_if_missing(True)
         cls.opt.set_plain_table_factory(PlainTableFactoryOptions())
         cls.opt.set_prefix_extractor(SliceTransform.create_max_len_prefix(8))
-        cls.test_dict = Rdict("./temp_big_int", cls.opt)
+        cls.path = f"./temp_big_int_{os.getpid()}"
+        cls.test_dict = Rdict(cls.path, cls.opt)
 
     def test_big_int(self):
         key = 13456436145354564353464754615223435465543
@@ -192,122 +285,178 @@ class TestBigInt(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         cls.test_dict.close()
-        Rdict.destroy("./temp_big_int", cls.opt)
+        Rdict.destroy(cls.path, cls.opt)
 
 
 class TestFloat(unittest.TestCase):
     test_dict = None
+    path = None
     ref_dict = None
     opt = None
+    write_opt = None
 
     @classmethod
     def setUpClass(cls) -> None:
-        cls.opt = Options()
-        cls.opt.create_if_missing(True)
-        cls.test_dict = Rdict("./temp_float", cls.opt)
+        cls.opt = short_lived_db_options()
+        cls.path = f"./temp_float_{os.getpid()}"
+        cls.test_dict = Rdict(cls.path, cls.opt)
+        cls.write_opt = short_lived_write_options()
+        cls.test_dict.set_write_options(cls.write_opt)
         cls.ref_dict = dict()
 
     def test_add_float(self):
-        for i in range(10000):
-            key = random()
-            value = random()
+        keys = [random() for _ in range(10000)]
+        values = [random() for _ in range(10000)]
+        for key, value in zip(keys, values):
             self.ref_dict[key] = value
             self.test_dict[key] = value
 
         compare_dicts(self, self.ref_dict, self.test_dict)
 
+    def test_add_float_batch(self):
+        keys = [random() for _ in range(10000)]
+        values = [random() for _ in range(10000)]
+        self.ref_dict.update(zip(keys, values))
+        bulk_put(self.test_dict, keys, values, self.write_opt)
+
+        compare_dicts(self, self.ref_dict, self.test_dict)
+
     def test_delete_float(self):
+        keys = list(self.ref_dict)
         for i in range(5000):
-            keys = [k for k in self.ref_dict.keys()]
-            key = keys[randint(0, len(self.ref_dict) - 1)]
+            idx = randint(0, len(keys) - 1)
+            key = keys[idx]
+            keys[idx] = keys[-1]
+            keys.pop()
             del self.ref_dict[key]
             del self.test_dict[key]
 
         compare_dicts(self, self.ref_dict, self.test_dict)
 
+    def test_delete_float_batch(self):
+        keys = sample(list(self.ref_dict), 5000)
+        for key in keys:
+            del self.ref_dict[key]
+        bulk_delete(self.test_dict, keys, self.write_opt)
+
+        compare_dicts(self, self.ref_dict, self.test_dict)
+
     def test_reopen(self):
         self.test_dict.close()
-        test_dict = Rdict("./temp_float", self.opt)
+        test_dict = Rdict(self.path, self.opt)
         compare_dicts(self, self.ref_dict, test_dict)
 
     def test_get_batch(self):
-        keys = list(self.ref_dict.keys())[:100]
+        keys = list(islice(self.ref_dict, 100))
         self.assertEqual(self.test_dict[keys + ["no such key"] * 3], [self.ref_dict[k] for k in keys] + [None] * 3)
 
     @classmethod
     def tearDownClass(cls):
-        Rdict.destroy("./temp_float", cls.opt)
+        Rdict.destroy(cls.path, cls.opt)
 
 
 class TestBytes(unittest.TestCase):
     test_dict = None
+    path = None
     ref_dict = None
     opt = None
+    write_opt = None
 
     @classmethod
     def setUpClass(cls) -> None:
-        cls.opt = Options()
-        cls.opt.create_if_missing(True)
+        cls.opt = short_lived_db_options()
         # for the moment do not use CuckooTable on windows
         if not sys.platform.startswith('win'):
             cls.opt.set_cuckoo_table_factory(CuckooTableOptions())
-            cls.opt.set_allow_mmap_reads(True)
-            cls.opt.set_allow_mmap_writes(True)
-        cls.test_dict = Rdict("./temp_bytes", cls.opt)
+        cls.path = f"./temp_bytes_{os.getpid()}"
+        cls.test_dict = Rdict(cls.path, cls.opt)
+        cls.write_opt = short_lived_write_options()
+        cls.test_dict.set_write_options(cls.write_opt)
         cls.ref_dict = dict()
 
     def test_add_bytes(self):
-        for i in range(10000):
-            key = randbytes(10)
-            value = randbytes(20)
-            self.assertEqual(getrefcount(key), 2)
-            self.assertEqual(getrefcount(value), 2)
-            self.test_dict[key] = value
-            # rdict does not increase ref_count
-            self.assertEqual(getrefcount(key), 2)
-            self.assertEqual(getrefcount(value), 2)
+        keys = bulk_randbytes(10000, 10)
+        values = bulk_randbytes(10000, 20)
+        for key, value in zip(keys, values):
             self.ref_dict[key] = value
-            self.assertEqual(getrefcount(key), 3)
-            self.assertEqual(getrefcount(value), 3)
+            self.test_dict[key] = value
+
+        compare_dicts(self, self.ref_dict, self.test_dict)
+
+    def test_add_bytes_batch(self):
+        keys = bulk_randbytes(10000, 10)
+        values = bulk_randbytes(10000, 20)
+        self.ref_dict.update(zip(keys, values))
+        bulk_put(self.test_dict, keys, values, self.write_opt)
 
         compare_dicts(self, self.ref_dict, self.test_dict)
 
     def test_delete_bytes(self):
+        keys = list(self.ref_dict)
         for i in range(5000):
-            keys = [k for k in self.ref_dict.keys()]
-            key = keys[randint(0, len(self.ref_dict) - 1)]
-            # key + ref_dict + keys + getrefcount -> 4
-            self.assertEqual(getrefcount(key), 4)
+            idx = randint(0, len(keys) - 1)
+            key = keys[idx]
             del self.test_dict[key]
-            self.assertEqual(getrefcount(key), 4)
             del self.ref_dict[key]
-            self.assertEqual(getrefcount(key), 3)
+            # swap-remove the deleted key from keys
+            keys[idx] = keys[-1]
+            keys.pop()
+
+        compare_dicts(self, self.ref_dict, self.test_dict)
+
+    def test_delete_bytes_batch(self):
+        keys = sample(list(self.ref_dict), 5000)
+        for key in keys:
+            del self.ref_dict[key]
+        bulk_delete(self.test_dict, keys, self.write_opt)
 
         compare_dicts(self, self.ref_dict, self.test_dict)
 
+    def test_refcount_invariant(self):
+        key = randbytes(10)
+        value = randbytes(20)
+        # key + getrefcount -> 2
+        self.assertEqual(getrefcount(key), 2)
+        self.assertEqual(getrefcount(value), 2)
+        self.test_dict[key] = value
+        # rdict does not keep references to key or value
+        self.assertEqual(getrefcount(key), 2)
+        self.assertEqual(getrefcount(value), 2)
+        wb = WriteBatch()
+        wb.put(key, value)
+        # write batch does not increase ref_count
+        self.assertEqual(getrefcount(key), 2)
+        self.assertEqual(getrefcount(value), 2)
+        self.test_dict.write(wb, self.write_opt)
+        del self.test_dict[key]
+        self.assertEqual(getrefcount(key), 2)
+        self.assertNotIn(key, self.test_dict)
+
     def test_reopen(self):
         self.test_dict.close()
-        test_dict = Rdict("./temp_bytes", self.opt)
+        test_dict = Rdict(self.path, self.opt)
         compare_dicts(self, self.ref_dict, test_dict)
 
     def test_get_batch(self):
-        keys = list(self.ref_dict.keys())[:100]
+        keys = list(islice(self.ref_dict, 100))
         self.assertEqual(self.test_dict[keys + ["no such key"] * 3], [self.ref_dict[k] for k in keys] + [None] * 3)
 
     @classmethod
     def tearDownClass(cls):
-        Rdict.destroy("./temp_bytes", cls.opt)
+        Rdict.destroy(cls.path, cls.opt)
 
 
 class TestString(unittest.TestCase):
     test_dict = None
+    path = None
     opt = None
 
     @classmethod
     def setUpClass(cls) -> None:
         cls.opt = Options()
         cls.opt.create_if_missing(True)
-        cls.test_dict = Rdict("./temp_string", cls.opt)
+        cls.path = f"./temp_string_{os.getpid()}"
+        cls.test_dict = Rdict(cls.path, cls.opt)
 
     def test_string(self):
         self.test_dict["Guangdong"] = "Shenzhen"
@@ -325,7 +474,7 @@ class TestString(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         del cls.test_dict
-        Rdict.destroy("./temp_string", cls.opt)
+        Rdict.destroy(cls.path, cls.opt)
 
 
 if __name__ == '__main__':